@@ -1,107 +1,400 @@
 import os
 import io
 import json
+import math
 import time
 import re
 import asyncio
-from typing import List, Dict
+import glob
+import hashlib
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional
 from fastapi import FastAPI, UploadFile, File, HTTPException, Query, WebSocket, WebSocketDisconnect, Header
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from pypdf import PdfReader
+import aiohttp
 import trafilatura
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import torch
 from sentence_transformers import SentenceTransformer
 import faiss
+import diskcache
 import uvicorn
 
 # ---------- CONFIG ----------
 EMBED_MODEL = os.getenv("EMBED_MODEL", "all-MiniLM-L6-v2")
 FAISS_INDEX_PATH = "faiss.index"
-FAISS_META_PATH = "faiss_meta.json"
+FAISS_META_PATH = "faiss_meta.parquet"
+LEGACY_META_PATH = "faiss_meta.json"
+EMBED_CACHE_PATH = "./embed_cache"
 CHUNK_SIZE = 800
 CHUNK_OVERLAP = 150
+# Below this many vectors an exhaustive flat scan is cheaper than IVF.
+IVF_MIN_VECTORS = 10000
+IVF_NPROBE = 16
+EMBED_BATCH_SIZE = 128
+# Larger batches for the one-shot encode over a whole ingest request.
+EMBED_BULK_BATCH_SIZE = 256
+URL_FETCH_CONCURRENCY = 16
+URL_FETCH_TIMEOUT = 30
+# Cosine similarity above which a query reuses a cached result set.
+QUERY_CACHE_SIM = 0.86
+QUERY_CACHE_MAX = 10000
+# Uploads are streamed in 1MB reads; spools roll to disk past 8MB.
+UPLOAD_READ_CHUNK = 1 << 20
+SPOOL_MAX_MEMORY = 8 << 20
+# Number of uvicorn workers sharing this machine; FAISS gets its share
+# of the cores so the OMP pools don't oversubscribe.
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
 # ----------------------------
 
 # ---------- Helpers ----------
+# PDF text extraction is CPU-bound (font decoding, glyph mapping) and
+# holds the GIL, so pages are farmed out to worker processes.
+PDF_POOL = ProcessPoolExecutor(max_workers=os.cpu_count())
+
+# Same story for HTML readability extraction: a CPU-bound lxml pipeline
+# that holds the GIL for 50-500ms per page.
+EXTRACT_POOL = ProcessPoolExecutor(max_workers=os.cpu_count())
+
+def _extract_html(html: str):
+    return trafilatura.extract(html, no_fallback=True,
+                               include_comments=False)
+
+def _extract_page(pdf_path: str, page_idx: int) -> str:
+    reader = PdfReader(pdf_path)
+    return reader.pages[page_idx].extract_text() or ""
+
+def _count_pages(pdf_path: str) -> int:
+    return len(PdfReader(pdf_path).pages)
+
+async def extract_pdf_text(pdf_path: str) -> str:
+    n_pages = await asyncio.to_thread(_count_pages, pdf_path)
+    loop = asyncio.get_event_loop()
+    texts = await asyncio.gather(
+        *[loop.run_in_executor(PDF_POOL, _extract_page, pdf_path, i)
+          for i in range(n_pages)])
+    return "\n".join(texts)
+
+_SENT_BREAK = re.compile(r'[.!?]\s+')
+
+def _windows(breaks, text_len, size, overlap):
+    # Greedy chunk windowing over sentence-break offsets, returning
+    # (start, end) span pairs. Kept free of Python objects so Numba can
+    # compile it; the caller slices the string once per span.
+    cap = text_len // max(size - overlap, 1) + 2 * len(breaks) + 2
+    out = np.empty((cap, 2), dtype=np.int64)
+    count = 0
+    start, i, n = 0, 0, len(breaks)
+    while i < n:
+        j = i
+        while j < n and breaks[j] - start <= size:
+            j += 1
+        if j == i:
+            # Oversize sentence: hard-slice it with a fixed stride.
+            end = breaks[i]
+            a = start
+            while a < end:
+                b = min(a + size, end)
+                out[count, 0] = a
+                out[count, 1] = b
+                count += 1
+                a += size - overlap
+            start = end
+            i += 1
+        else:
+            end = breaks[j - 1]
+            out[count, 0] = start
+            out[count, 1] = end
+            count += 1
+            start = max(end - overlap, 0)
+            i = j
+    return out[:count]
+
+try:
+    from numba import njit
+    _windows = njit(cache=True)(_windows)
+except ImportError:
+    pass
+
 def split_text(text: str, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
     if not text:
         return []
-    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
-    chunks, cur = [], ""
-    for s in sentences:
-        if len(cur) + len(s) <= size:
-            cur = (cur + " " + s).strip()
-        else:
-            if cur:
-                chunks.append(cur)
-            if len(s) > size:
-                for i in range(0, len(s), size - overlap):
-                    chunks.append(s[i:i+size])
-                cur = ""
-            else:
-                cur = s
-    if cur:
-        chunks.append(cur)
-    return chunks
+    text = text.strip()
+    if not text:
+        return []
+    # Single pass over sentence-break offsets; chunks are slices of the
+    # original string, so no per-sentence concatenation or copying.
+    breaks = np.fromiter((m.end() for m in _SENT_BREAK.finditer(text)),
+                         dtype=np.int64)
+    breaks = np.append(breaks, len(text))
+    spans = _windows(breaks, len(text), size, overlap)
+    chunks = (text[a:b].strip() for a, b in spans)
+    return [c for c in chunks if c]
 
 # ---------- FAISS Store ----------
 class FaissStore:
+    # Metadata is kept as parallel columns (struct-of-arrays) rather
+    # than a list of dicts: search only touches the fields it needs,
+    # and Parquet persistence is far smaller and faster than JSON.
     def __init__(self):
         self.index = None
-        self.metadata: List[dict] = []
+        self.titles: List[str] = []
+        self.urls: List[str] = []
+        self.ids: List[str] = []
+        self.texts: List[str] = []
         self.dim = None
+        # Reusable float32 staging buffer for add(); grown on demand so
+        # steady-state ingest does no per-batch allocation.
+        self._scratch = None
+        # Vectors added since the last save; persisted as a small shard
+        # file so save cost is O(delta) instead of O(N).
+        self._pending = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def meta_at(self, idx: int) -> dict:
+        return {
+            "title": self.titles[idx],
+            "url": self.urls[idx],
+            "chunk_id": self.ids[idx],
+            "text": self.texts[idx],
+        }
 
     def init_if_needed(self, dim):
         if self.index is None:
             self.dim = dim
+            # Start flat; we migrate to IVF once the corpus is big enough
+            # for the training + cell-probe overhead to pay off.
             self.index = faiss.IndexFlatIP(dim)
 
-    def add(self, embs, metas):
+    def _maybe_migrate_to_ivf(self):
+        if not isinstance(self.index, faiss.IndexFlatIP):
+            return
+        n = self.index.ntotal
+        if n < IVF_MIN_VECTORS:
+            return
+        nlist = int(math.sqrt(n))
+        quantizer = faiss.IndexFlatIP(self.dim)
+        # 8-bit scalar quantization: 4x smaller vectors, SIMD int8
+        # inner-product kernels, <1% recall loss at this dimension.
+        ivf = faiss.IndexIVFScalarQuantizer(quantizer, self.dim, nlist,
+                                            faiss.ScalarQuantizer.QT_8bit,
+                                            faiss.METRIC_INNER_PRODUCT)
+        xb = self.index.reconstruct_n(0, n)
+        ivf.train(xb)
+        ivf.add(xb)
+        ivf.nprobe = IVF_NPROBE
+        self.index = ivf
+        print(f"[store] Migrated to IVF+SQ8 index (nlist={nlist})")
+
+    def _scratch_for(self, n):
+        if self._scratch is None or self._scratch.shape[0] < n:
+            self._scratch = np.empty((n, self.dim), dtype=np.float32)
+        return self._scratch[:n]
+
+    def add(self, embs, titles, urls, chunk_ids, texts):
         if len(embs) == 0:
             return
         self.init_if_needed(embs.shape[1])
-        norm = embs / (np.linalg.norm(embs, axis=1, keepdims=True) + 1e-8)
-        self.index.add(norm.astype("float32"))
-        self.metadata.extend(metas)
+        # Stage the batch in the reusable arena (casting to float32 in
+        # the copy) and renormalize in place; this also squeezes out the
+        # rounding drift from fp16 cache round trips.
+        buf = self._scratch_for(len(embs))
+        np.copyto(buf, embs)
+        faiss.normalize_L2(buf)
+        self.index.add(buf)
+        self._pending.append(buf.copy())
+        self.titles.extend(titles)
+        self.urls.extend(urls)
+        self.ids.extend(chunk_ids)
+        self.texts.extend(texts)
+        self._maybe_migrate_to_ivf()
+
+    def search_many(self, q_embs, k=5):
+        # One FAISS call over the stacked queries: the scan is a single
+        # sgemm instead of one dot-product pass per query.
+        if self.index is None or self.index.ntotal == 0:
+            return [[] for _ in range(len(q_embs))]
+        q_embs = np.ascontiguousarray(q_embs, dtype="float32")
+        D, I = self.index.search(q_embs, k)
+        results = []
+        for d_row, i_row in zip(D, I):
+            out = []
+            for score, idx in zip(d_row, i_row):
+                if idx < 0 or idx >= len(self.ids):
+                    continue
+                m = self.meta_at(idx)
+                m["score"] = float(score)
+                out.append(m)
+            results.append(out)
+        return results
 
     def search(self, q_emb, k=5):
-        if self.index is None or self.index.ntotal == 0:
-            return []
-        qn = q_emb / (np.linalg.norm(q_emb, axis=1, keepdims=True) + 1e-8)
-        D, I = self.index.search(qn.astype("float32"), k)
-        out = []
-        for score, idx in zip(D[0], I[0]):
-            if idx < 0 or idx >= len(self.metadata):
-                continue
-            m = self.metadata[idx].copy()
-            m["score"] = float(score)
-            out.append(m)
-        return out
+        return self.search_many(q_emb, k)[0]
+
+    @staticmethod
+    def _shard_paths():
+        return sorted(glob.glob(FAISS_INDEX_PATH + ".shard*"))
 
     def save(self):
-        if self.index:
-            faiss.write_index(self.index, FAISS_INDEX_PATH)
-        with open(FAISS_META_PATH, "w") as f:
-            json.dump(self.metadata, f, indent=2)
+        if self.index is not None:
+            if not os.path.exists(FAISS_INDEX_PATH):
+                faiss.write_index(self.index, FAISS_INDEX_PATH)
+                self._pending = []
+            elif self._pending:
+                # Append-only shard with just the vectors added since
+                # the last save; shards are folded back into the base
+                # index on the next load.
+                shard = faiss.IndexFlatIP(self.dim)
+                shard.add(np.vstack(self._pending))
+                n = len(self._shard_paths())
+                faiss.write_index(shard, f"{FAISS_INDEX_PATH}.shard{n:05d}")
+                self._pending = []
+        table = pa.table({
+            "title": self.titles,
+            "url": self.urls,
+            "chunk_id": self.ids,
+            "text": self.texts,
+        })
+        # zstd shrinks the text-heavy columns ~4x over the default codec.
+        pq.write_table(table, FAISS_META_PATH, compression="zstd")
 
     def load(self):
         if os.path.exists(FAISS_META_PATH):
-            with open(FAISS_META_PATH) as f:
-                self.metadata = json.load(f)
-            print(f"[store] Loaded metadata: {len(self.metadata)} items")
+            cols = pq.read_table(FAISS_META_PATH).to_pydict()
+            self.titles = cols["title"]
+            self.urls = cols["url"]
+            self.ids = cols["chunk_id"]
+            self.texts = cols["text"]
+            print(f"[store] Loaded metadata: {len(self)} items")
+        elif os.path.exists(LEGACY_META_PATH):
+            # One-time migration from the old list-of-dicts JSON file.
+            with open(LEGACY_META_PATH) as f:
+                for m in json.load(f):
+                    self.titles.append(m["title"])
+                    self.urls.append(m["url"])
+                    self.ids.append(m["chunk_id"])
+                    self.texts.append(m["text"])
+            print(f"[store] Migrated legacy metadata: {len(self)} items")
 
         if os.path.exists(FAISS_INDEX_PATH):
             self.index = faiss.read_index(FAISS_INDEX_PATH)
             self.dim = self.index.d
-            print(f"[store] Loaded FAISS index (dim={self.dim})")
+            if isinstance(self.index, faiss.IndexIVF):
+                self.index.nprobe = IVF_NPROBE
+            shards = self._shard_paths()
+            for sp in shards:
+                sh = faiss.read_index(sp)
+                self.index.add(sh.reconstruct_n(0, sh.ntotal))
+            self._maybe_migrate_to_ivf()
+            if shards:
+                # Consolidate once at startup so serving-time saves stay
+                # O(delta).
+                faiss.write_index(self.index, FAISS_INDEX_PATH)
+                for sp in shards:
+                    os.remove(sp)
+            print(f"[store] Loaded FAISS index (dim={self.dim}, "
+                  f"ntotal={self.index.ntotal}, shards={len(shards)})")
+
+
+# ---------- Query Cache ----------
+class QueryCache:
+    # Near-duplicate questions are common in equity research; queries
+    # whose embedding lands within QUERY_CACHE_SIM of a past query get
+    # that query's results without touching the main index.
+    def __init__(self, threshold=QUERY_CACHE_SIM, max_size=QUERY_CACHE_MAX):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.index = None
+        self.results = OrderedDict()  # centroid id -> (top_k, result list)
+        self._next_id = 0
+
+    def get(self, emb, k):
+        if self.index is None or self.index.ntotal == 0:
+            return None
+        D, I = self.index.search(emb, 1)
+        cid = int(I[0, 0])
+        if cid < 0 or D[0, 0] < self.threshold:
+            return None
+        cached_k, results = self.results[cid]
+        # Only serve hits computed for at least as many results as the
+        # caller wants; a smaller cached top_k falls through to a real
+        # search.
+        if cached_k < k:
+            return None
+        self.results.move_to_end(cid)
+        return results[:k]
+
+    def put(self, emb, results, k):
+        if self.index is None:
+            self.index = faiss.IndexIDMap(faiss.IndexFlatIP(emb.shape[1]))
+        cid = self._next_id
+        self._next_id += 1
+        self.index.add_with_ids(emb, np.array([cid], dtype="int64"))
+        self.results[cid] = (k, results)
+        if len(self.results) > self.max_size:
+            old_id, _ = self.results.popitem(last=False)
+            self.index.remove_ids(np.array([old_id], dtype="int64"))
+
+    def clear(self):
+        self.index = None
+        self.results.clear()
+        self._next_id = 0
 
 
 # ---------- INIT ----------
-embed_model = SentenceTransformer(EMBED_MODEL)
+faiss.omp_set_num_threads(max(1, (os.cpu_count() or 1) // max(1, WEB_WORKERS)))
+
+EMBED_DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+embed_model = SentenceTransformer(EMBED_MODEL, device=EMBED_DEVICE)
+if EMBED_DEVICE == "cuda":
+    embed_model.half()
+
+# Content-addressed cache: hash(model || text) -> fp16 vector bytes.
+# Re-uploading the same PDF or re-crawling a URL skips the forward pass.
+embed_cache = diskcache.Cache(EMBED_CACHE_PATH)
+
+def _cache_key(text: str):
+    return hashlib.blake2b((EMBED_MODEL + text).encode("utf-8")).digest()
+
+def encode_texts(parts, batch_size=EMBED_BATCH_SIZE):
+    # Boilerplate chunks (disclaimers, repeated footers) recur within a
+    # batch; encode each distinct text once and broadcast the vectors
+    # back to their original positions.
+    unique, inverse = np.unique(np.asarray(parts, dtype=object),
+                                return_inverse=True)
+    keys = [_cache_key(p) for p in unique]
+    vecs = [None] * len(unique)
+    miss_idx = []
+    for i, key in enumerate(keys):
+        buf = embed_cache.get(key)
+        if buf is not None:
+            vecs[i] = np.frombuffer(buf, dtype=np.float16).astype("float32")
+        else:
+            miss_idx.append(i)
+    if miss_idx:
+        new = embed_model.encode([unique[i] for i in miss_idx],
+                                 batch_size=batch_size,
+                                 normalize_embeddings=True,
+                                 convert_to_numpy=True,
+                                 show_progress_bar=False)
+        for j, i in enumerate(miss_idx):
+            vec = np.asarray(new[j], dtype="float32")
+            embed_cache[keys[i]] = vec.astype(np.float16).tobytes()
+            vecs[i] = vec
+    return np.asarray(vecs, dtype="float32")[inverse]
+
 store = FaissStore()
 store.load()
+query_cache = QueryCache()
 
 
 # ========== WEBSOCKET MANAGER ==========
@@ -148,7 +441,8 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
 
 # ---------- Models ----------
 class QueryRequest(BaseModel):
-    query: str
+    query: Optional[str] = None
+    queries: Optional[List[str]] = None
     top_k: int = 5
 
 class UrlsReq(BaseModel):
@@ -158,7 +452,7 @@ class UrlsReq(BaseModel):
 # ---------- STATUS ----------
 @app.get("/status")
 def status():
-    return {"ready": True, "indexed": len(store.metadata)}
+    return {"ready": True, "indexed": len(store)}
 
 
 # ---------- INGEST FILES ----------
@@ -172,67 +466,82 @@ async def ingest(files: List[UploadFile] = File(...),
         if x_client_id:
             await ws_manager.send(x_client_id, {"event": event, **data})
 
+    # Phase 1: parse every file into chunks, remembering each file's
+    # slice of the combined list so one encode can cover the request.
+    all_parts: List[str] = []
+    doc_spans = []  # (filename, start, end) into all_parts
+
+    async def spool_upload(f, dst):
+        # Stream the upload in bounded reads instead of f.read()-ing the
+        # whole file into one giant bytes object.
+        while chunk := await f.read(UPLOAD_READ_CHUNK):
+            dst.write(chunk)
+        dst.seek(0)
+
     for f in files:
         name = f.filename
-        b = await f.read()
 
         await notify("file_start", {"file": name})
 
-        text = ""
-
-        # PDF
+        # PDF: the page-extraction worker processes need independent
+        # random access, so spill to a named temp file and pass the path.
         if name.lower().endswith(".pdf"):
-            reader = PdfReader(io.BytesIO(b))
-            text = "\n".join([p.extract_text() or "" for p in reader.pages])
+            tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+            try:
+                await spool_upload(f, tmp)
+                parts = split_text(await extract_pdf_text(tmp.name))
+            finally:
+                tmp.close()
+                os.unlink(tmp.name)
 
         # CSV → row mode
         elif name.lower().endswith(".csv"):
-            df = pd.read_csv(io.BytesIO(b))
-            rows = []
-            for _, row in df.iterrows():
-                items = [f"{c}: {row[c]}" for c in df.columns]
-                rows.append(" | ".join(items))
-
-            parts = rows
-            embs = embed_model.encode(parts, convert_to_numpy=True)
-
-            metas = []
-            ts = int(time.time())
-            for i, t in enumerate(parts):
-                metas.append({
-                    "title": name,
-                    "url": None,
-                    "chunk_id": f"{name}_{ts}_{i}",
-                    "text": t
-                })
-
-            store.add(embs, metas)
-            added_total += len(parts)
-            await notify("file_done", {"file": name, "added": len(parts)})
-            continue
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as spool:
+                await spool_upload(f, spool)
+                df = await asyncio.to_thread(pd.read_csv, spool)
+            # Vectorized "col: value | col: value" per row; one C-level
+            # pass per column instead of a Python loop per cell.
+            parts_series = None
+            for c in df.columns:
+                s = (f"{c}: ") + df[c].astype(str)
+                parts_series = s if parts_series is None else parts_series + " | " + s
+            parts = [] if parts_series is None else parts_series.tolist()
 
         # Text
         else:
-            text = b.decode("utf-8", errors="ignore")
-
-        parts = split_text(text)
-        embs = embed_model.encode(parts, convert_to_numpy=True)
-
-        metas = []
-        ts = int(time.time())
-        for i, t in enumerate(parts):
-            metas.append({
-                "title": name,
-                "url": None,
-                "chunk_id": f"{name}_{ts}_{i}",
-                "text": t
-            })
-
-        store.add(embs, metas)
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as spool:
+                await spool_upload(f, spool)
+                text = io.TextIOWrapper(spool, encoding="utf-8",
+                                        errors="ignore").read()
+            parts = split_text(text)
+
+        start = len(all_parts)
+        all_parts.extend(parts)
+        doc_spans.append((name, start, len(all_parts)))
+
+    # Phase 2: one encode over every chunk in the request, then split
+    # the result back per file.
+    embs = await asyncio.to_thread(encode_texts, all_parts,
+                                   EMBED_BULK_BATCH_SIZE)
+
+    ts = int(time.time())
+    for name, start, end in doc_spans:
+        parts = all_parts[start:end]
+        # add() can train the IVF migration when the corpus crosses the
+        # flat-index threshold, so it runs off the event loop as well.
+        await asyncio.to_thread(
+            store.add, embs[start:end],
+            titles=[name] * len(parts),
+            urls=[None] * len(parts),
+            chunk_ids=[f"{name}_{ts}_{i}" for i in range(len(parts))],
+            texts=parts)
         added_total += len(parts)
         await notify("file_done", {"file": name, "added": len(parts)})
 
-    store.save()
+    # save() rewrites the metadata Parquet; keep it off the loop too.
+    await asyncio.to_thread(store.save)
+    # New documents can change the best answers; drop cached results.
+    query_cache.clear()
     await notify("ingest_done", {"added": added_total})
     return {"status": "ok", "added": added_total}
 
@@ -247,54 +556,95 @@ async def ingest_urls(req: UrlsReq, x_client_id: str = Header(None)):
 
     total_added = 0
 
-    for url in req.urls:
-        await notify("url_start", {"url": url})
-
-        html = trafilatura.fetch_url(url)
-        text = trafilatura.extract(html) if html else None
+    # Fetch all URLs concurrently; extraction is CPU-only and runs off
+    # the event loop.
+    sem = asyncio.Semaphore(URL_FETCH_CONCURRENCY)
 
+    async def fetch_and_extract(sess, url):
+        await notify("url_start", {"url": url})
+        try:
+            async with sem:
+                async with sess.get(url, timeout=aiohttp.ClientTimeout(total=URL_FETCH_TIMEOUT)) as r:
+                    r.raise_for_status()
+                    html = await r.text()
+            loop = asyncio.get_event_loop()
+            text = await loop.run_in_executor(EXTRACT_POOL, _extract_html, html)
+        except Exception:
+            text = None
+        return url, text
+
+    async with aiohttp.ClientSession() as sess:
+        results = await asyncio.gather(
+            *[fetch_and_extract(sess, u) for u in req.urls])
+
+    # Chunk every successful URL first, then encode the whole request
+    # in one batch and split the vectors back per URL.
+    all_parts: List[str] = []
+    doc_spans = []  # (url, start, end) into all_parts
+
+    for url, text in results:
         if not text:
             await notify("url_error", {"url": url})
             continue
 
         parts = split_text(text)
-        embs = embed_model.encode(parts, convert_to_numpy=True)
-
-        metas = []
-        ts = int(time.time())
-        for i, t in enumerate(parts):
-            metas.append({
-                "title": None,
-                "url": url,
-                "chunk_id": f"url_{ts}_{i}",
-                "text": t
-            })
-
-        store.add(embs, metas)
+        start = len(all_parts)
+        all_parts.extend(parts)
+        doc_spans.append((url, start, len(all_parts)))
+
+    embs = await asyncio.to_thread(encode_texts, all_parts,
+                                   EMBED_BULK_BATCH_SIZE)
+
+    ts = int(time.time())
+    for url, start, end in doc_spans:
+        parts = all_parts[start:end]
+        await asyncio.to_thread(
+            store.add, embs[start:end],
+            titles=[None] * len(parts),
+            urls=[url] * len(parts),
+            chunk_ids=[f"url_{ts}_{i}" for i in range(start, end)],
+            texts=parts)
         total_added += len(parts)
         await notify("url_done", {"url": url, "added": len(parts)})
 
-    store.save()
+    # save() rewrites the metadata Parquet; keep it off the loop too.
+    await asyncio.to_thread(store.save)
+    # New documents can change the best answers; drop cached results.
+    query_cache.clear()
     await notify("ingest_done", {"added": total_added})
     return {"status": "ok", "added": total_added}
 
 
 # ---------- QUERY ----------
 @app.post("/query")
-def query_endpoint(req: QueryRequest):
+async def query_endpoint(req: QueryRequest):
+    # Batch mode: embed and search all queries in one shot, bypassing
+    # the semantic cache (batch callers are usually scripted sweeps).
+    if req.queries:
+        embs = await asyncio.to_thread(encode_texts, req.queries)
+        res = await asyncio.to_thread(store.search_many, embs, req.top_k)
+        return {"answers": res}
+
     q = req.query
     if not q:
         raise HTTPException(400, "Query missing")
 
-    emb = embed_model.encode([q], convert_to_numpy=True)
-    res = store.search(emb, k=req.top_k)
+    emb = await asyncio.to_thread(encode_texts, [q])
+    cached = query_cache.get(emb, req.top_k)
+    if cached is not None:
+        return {"answers": cached}
+
+    res = await asyncio.to_thread(store.search, emb, req.top_k)
+    query_cache.put(emb, res, req.top_k)
     return {"answers": res}
 
 
 # ---------- META ----------
 @app.get("/meta")
 def get_meta(n: int = 20):
-    return {"total": len(store.metadata), "items": store.metadata[-n:][::-1]}
+    total = len(store)
+    items = [store.meta_at(i) for i in range(total - 1, max(total - n, 0) - 1, -1)]
+    return {"total": total, "items": items}
 
 
 if __name__ == "__main__":
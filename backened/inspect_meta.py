@@ -1,11 +1,11 @@
 # inspect_meta.py
-import json, itertools
+import itertools
+import pyarrow.parquet as pq
 
-META = "faiss_meta.json"
+META = "faiss_meta.parquet"
 n = 20  # change how many entries to show
 
-with open(META, "r", encoding="utf-8") as f:
-    meta = json.load(f)
+meta = pq.read_table(META).to_pylist()
 
 print(f"Total metadata entries: {len(meta)}\n")
 for i, item in enumerate(itertools.islice(meta, n)):